@@ -4,14 +4,24 @@
 
     The main REPL loop. Reads user input, feeds it through the
     ContextManager and provider, and prints the reply. Handles
-    multiline input, paste mode, and calls for a possible
-    summarization between turns.
+    multiline input, bracketed paste, paste mode, and calls for a
+    possible summarization between turns.
 
 """
 
 import argparse
+import atexit
 import sys
 
+try:
+    import termios
+except ImportError:  # not available on Windows
+    termios = None
+
+import requests
+
+from tiny_agent.core.batches import BatchStore
+from tiny_agent.core.cache import MemoryResponseCache, ResponseCache
 from tiny_agent.core.context import ContextManager, SYSTEM_PROMPT
 from tiny_agent.core.state import StateManager
 from tiny_agent.core.ai_providers import (
@@ -20,7 +30,21 @@ from tiny_agent.core.ai_providers import (
     OpenAIProvider
 )
 from tiny_agent.core.messages import Role
-from tiny_agent.core.utils import colorize, load_env_files, parse_debug_flags, debug_enabled
+from tiny_agent.core.utils import (
+    DEBUG_CONTEXT,
+    DEBUG_REQUESTS,
+    DEBUG_STATE,
+    debug_enabled,
+    load_env_files,
+    paint,
+    paint_codes,
+    parse_debug_flags,
+    set_color_enabled,
+)
+
+# markers the terminal wraps pasted text in once bracketed paste is on
+PASTE_START = "\x1b[200~"
+PASTE_END = "\x1b[201~"
 
 
 def main(argv=None):
@@ -34,15 +58,17 @@ def main(argv=None):
     provider = build_provider(
         args.provider,
         args.model,
-        debug_enabled("requests", debug_flags),
+        debug_enabled(DEBUG_REQUESTS, debug_flags),
         args.api_key,
+        build_cache(args.cache),
     )
 
     state_manager = StateManager()
-    context_manager = ContextManager()
+    context_manager = ContextManager(inline_summary=args.inline_summary)
     context_manager.add_message(Role.SYSTEM, SYSTEM_PROMPT)
 
-    color_enabled = not args.no_color
+    # colors only make sense on a terminal, not when output is piped
+    set_color_enabled(not args.no_color and sys.stdout.isatty())
 
     banner = f"""
                         Tiny Agent
@@ -56,31 +82,50 @@ __/       /       - /paste - paste mode (/submit to send request)
 <__.|_|-|_|       - Type 'exit' or 'quit' to leave
  ================================================================
 """
-    print(colorize(banner, "yellow", color_enabled))
+    print(paint(banner, "yellow"))
+
+    enable_bracketed_paste()
+
+    batch_store = BatchStore()
+    batch_queue = []
+    pending = batch_store.pending(provider.name)
+    if pending:
+        print(paint(f"{len(pending)} batch(es) pending, use /batch-poll to collect them", "gray"))
+
+    # colored strings used on every turn, built once
+    prompt_first = paint(">>> ", "cyan")
+    prompt_cont = "\n" + paint("... ", "cyan")
+    paste_hint = paint("Paste mode enabled. Finish with /submit", "gray")
+    thinking = paint("\nThinking…", "gray")
+    cancelled = paint("(request cancelled)", "gray")
+    agent_label = paint("\ntiny-agent:\n\n", "yellow")
 
     buffer = []
     while True:
         try:
             # handle user prompt
-            prompt_symbol = "... " if buffer else ">>> "
-            prefix = "\n" if buffer else ""
-            prompt = prefix + colorize(prompt_symbol, "cyan", color_enabled)
-            user_input = input(prompt).strip()
+            prompt = prompt_cont if buffer else prompt_first
+            user_input = read_input(prompt).strip()
         except (KeyboardInterrupt, EOFError):
             print("\nBye!")
             break
 
         # handle 'paste mode'
         if user_input == "/paste":
-            print(colorize("Paste mode enabled. Finish with /submit", "gray", color_enabled))
+            print(paste_hint)
             pasted = []
 
             while True:
+                # plain line reads, no prompt handling per pasted line
                 try:
-                    line = input().rstrip("\n")
-                except (KeyboardInterrupt, EOFError):
-                    line = "/submit"
+                    line = sys.stdin.readline()
+                except KeyboardInterrupt:
+                    line = ""
+
+                if not line:
+                    break
 
+                line = line.rstrip("\n").replace(PASTE_START, "").replace(PASTE_END, "")
                 if line == "/submit":
                     break
 
@@ -106,19 +151,44 @@ __/       /       - /paste - paste mode (/submit to send request)
             print("Goodbye!")
             break
 
+        # handle batch commands
+        command, _, rest = user_input.partition(" ")
+        if command == "/batch-add":
+            if rest.strip():
+                batch_queue.append(rest.strip())
+                print(paint(f"Queued prompt #{len(batch_queue)}, send with /batch-submit", "gray"))
+            else:
+                print(paint("Usage: /batch-add <prompt>", "gray"))
+            continue
+
+        if command == "/batch-submit":
+            if submit_batch(provider, context_manager, state_manager,
+                            batch_store, batch_queue):
+                batch_queue = []
+            continue
+
+        if command == "/batch-poll":
+            poll_batches(provider, context_manager, state_manager, batch_store)
+            continue
+
         # add input to context
         context_manager.add_message(Role.USER, user_input)
 
         # summarize if we reach token threshold or message count threshold
         context_manager.maybe_summarize(provider, state_manager)
 
-        print(colorize("\nThinking…", "gray", color_enabled))
+        print(thinking)
 
         try:
             # AI api call
-            reply = provider.generate(context_manager, state_manager)
+            if args.stream:
+                reply = stream_reply(provider, context_manager, state_manager, agent_label)
+            else:
+                reply = provider.generate(context_manager, state_manager)
         except KeyboardInterrupt:
-            print(colorize("(request cancelled)", "gray", color_enabled))
+            if args.stream:
+                print()
+            print(cancelled)
             # let the provider know we cancelled a request in next call
             context_manager.add_message(Role.ASSISTANT, "(cancelled)")
             # skip and wait for new input
@@ -126,17 +196,162 @@ __/       /       - /paste - paste mode (/submit to send request)
 
         # add the AI response to our context
         context_manager.add_message(Role.ASSISTANT, reply)
-        # print response
-        agent_label = colorize("\ntiny-agent:\n\n", "yellow", color_enabled)
-        colored_reply = colorize(reply, "yellow", color_enabled)
-        print(f"{agent_label} {colored_reply}\n")
 
-        if debug_enabled("state", debug_flags):
+        if not args.stream:
+            # print response
+            colored_reply = paint(reply, "yellow")
+            print(f"{agent_label} {colored_reply}\n")
+
+        if debug_enabled(DEBUG_STATE, debug_flags):
             state_manager.print_snapshot()
 
-        if debug_enabled("context", debug_flags):
+        if debug_enabled(DEBUG_CONTEXT, debug_flags):
             context_manager.print_context()
 
+    provider.close()
+
+
+def enable_bracketed_paste():
+    """Ask the terminal to wrap pasted text in PASTE_START/PASTE_END.
+
+    A pasted block can then be read as a single prompt, newlines
+    included, without going through /paste. ECHOCTL is turned off so
+    the markers are not echoed back as '^[[200~'. Both settings are
+    restored on exit. Does nothing when stdin/stdout is not a tty.
+    """
+
+    if termios is None or not sys.stdin.isatty() or not sys.stdout.isatty():
+        return
+
+    fd = sys.stdin.fileno()
+    saved = termios.tcgetattr(fd)
+    attrs = termios.tcgetattr(fd)
+    attrs[3] &= ~getattr(termios, "ECHOCTL", 0)
+    termios.tcsetattr(fd, termios.TCSANOW, attrs)
+
+    sys.stdout.write("\x1b[?2004h")
+    sys.stdout.flush()
+
+    def restore():
+        sys.stdout.write("\x1b[?2004l")
+        sys.stdout.flush()
+        termios.tcsetattr(fd, termios.TCSANOW, saved)
+
+    atexit.register(restore)
+
+
+def read_input(prompt):
+    """Read one prompt. A bracketed paste is collected up to its end
+    marker and returned as one multi-line string."""
+
+    line = input(prompt)
+    if PASTE_START not in line:
+        return line
+
+    lines = [line]
+    while PASTE_END not in line:
+        line = input()
+        lines.append(line)
+
+    return "\n".join(lines).replace(PASTE_START, "").replace(PASTE_END, "")
+
+
+def stream_reply(provider, context_manager, state_manager, agent_label):
+    """Print the reply as it streams in and return the full text."""
+
+    # color codes go out once around the reply, not around every piece
+    color_start, color_end = paint_codes("yellow")
+    sys.stdout.write(f"{agent_label} {color_start}")
+    parts = []
+
+    try:
+        for piece in provider.generate_stream(context_manager, state_manager):
+            sys.stdout.write(piece)
+            sys.stdout.flush()
+            parts.append(piece)
+    finally:
+        # reset even when cancelled, so the terminal isn't left colored
+        sys.stdout.write(color_end)
+
+    sys.stdout.write("\n\n")
+    return "".join(parts).strip()
+
+
+def submit_batch(provider, context_manager, state_manager, batch_store, prompts):
+    """Send the queued prompts as one batch request and wait for the
+    replies. Returns True once the batch was accepted by the provider."""
+
+    if not prompts:
+        print(paint("Nothing queued, use /batch-add <prompt> first", "gray"))
+        return False
+
+    try:
+        entries = provider.batch_entries(context_manager, prompts)
+        batch_id = provider.submit_batch(entries)
+    except NotImplementedError:
+        print(paint(f"{provider.name} provider does not support batches", "gray"))
+        return False
+    except requests.RequestException as exc:
+        print(paint(f"{provider.name} batch submit failed: {exc}", "gray"))
+        return False
+
+    queued = {custom_id: prompt for (custom_id, _), prompt in zip(entries, prompts)}
+    batch_store.add(provider.name, batch_id, queued)
+
+    print(paint(f"Batch {batch_id} submitted, waiting for results "
+                "(Ctrl+C to keep it pending, /batch-poll to check later)", "gray"))
+
+    try:
+        replies = provider.poll_batch(batch_id, state_manager)
+    except KeyboardInterrupt:
+        print(paint(f"Batch {batch_id} left pending", "gray"))
+        return True
+    except requests.RequestException as exc:
+        print(paint(f"{provider.name} batch poll failed: {exc}", "gray"))
+        return True
+
+    add_batch_replies(provider, context_manager, batch_store, batch_id, queued, replies)
+    return True
+
+
+def poll_batches(provider, context_manager, state_manager, batch_store):
+    """Collect the results of every finished batch for this provider."""
+
+    pending = batch_store.pending(provider.name)
+    if not pending:
+        print(paint("No pending batches", "gray"))
+        return
+
+    for batch_id, queued in pending:
+        try:
+            replies = provider.collect_batch(batch_id, state_manager)
+        except requests.RequestException as exc:
+            print(paint(f"{provider.name} batch poll failed: {exc}", "gray"))
+            continue
+
+        if replies is None:
+            print(paint(f"Batch {batch_id} is still processing", "gray"))
+            continue
+
+        add_batch_replies(provider, context_manager, batch_store, batch_id, queued, replies)
+
+
+def add_batch_replies(provider, context_manager, batch_store, batch_id, queued, replies):
+    """Add each batched prompt and its reply to the context, print them,
+    and drop the batch from the store."""
+
+    for custom_id, prompt in queued.items():
+        reply = replies.get(custom_id) or f"{provider.name}: no result for this prompt"
+        context_manager.add_message(Role.USER, prompt)
+        context_manager.add_message(Role.ASSISTANT, reply)
+
+        prompt_label = paint(f"\n[{custom_id}] ", "cyan")
+        agent_label = paint("\ntiny-agent:\n\n", "yellow")
+        colored_reply = paint(reply, "yellow")
+        print(f"{prompt_label}{prompt}\n{agent_label} {colored_reply}\n")
+
+    batch_store.remove(batch_id)
+
 
 def parse_args(argv):
     """Parse CLI arguments for provider selection."""
@@ -164,6 +379,24 @@ def parse_args(argv):
         const="all",
         help="Debug categories: state, context, requests (comma-separated, or 'all')",
     )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Print the reply as it is generated instead of all at once",
+    )
+    parser.add_argument(
+        "--cache",
+        nargs="?",
+        const="sqlite",
+        choices=["sqlite", "memory"],
+        help="Reuse responses for identical requests: 'sqlite' (default, "
+             "~/.tiny_agent/cache.db) or 'memory' (this session only)",
+    )
+    parser.add_argument(
+        "--inline-summary",
+        action="store_true",
+        help="Ask for the context summary within the next reply instead of a separate request",
+    )
     parser.add_argument(
         "--no-color",
         action="store_true",
@@ -172,7 +405,19 @@ def parse_args(argv):
     return parser.parse_args(argv if argv is not None else sys.argv[1:])
 
 
-def build_provider(provider_name, model, debug, api_key):
+def build_cache(kind):
+    """Return the response cache selected with --cache, if any."""
+
+    if kind == "sqlite":
+        return ResponseCache()
+
+    if kind == "memory":
+        return MemoryResponseCache()
+
+    return None
+
+
+def build_provider(provider_name, model, debug, api_key, cache=None):
     """Instantiate the provider requested on the CLI."""
 
     normalized = (provider_name or "local").lower()
@@ -185,6 +430,7 @@ def build_provider(provider_name, model, debug, api_key):
             api_key=api_key,
             model=model or "claude-3-haiku-20240307",
             debug=debug,
+            cache=cache,
         )
 
     if normalized == "openai":
@@ -192,6 +438,7 @@ def build_provider(provider_name, model, debug, api_key):
             api_key=api_key,
             model=model or "gpt-4o-mini",
             debug=debug,
+            cache=cache,
         )
 
     raise ValueError(f"Unknown provider '{provider_name}'")
@@ -10,18 +10,141 @@
 """
 
 import json
+import logging
 import os
 import re
+import sys
+import time
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-from .context import ContextManager
-from .messages import Role
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from .cache import cache_key
+from .messages import SUMMARY_MSG_KIND, Role
 
 _HYPOTHESIS_RE = re.compile(r"^\[HYPOTHESIS:\s*(.+?)\]\s*\n?", re.MULTILINE)
+_HYPOTHESIS_TAG = "[HYPOTHESIS:"
+
+_SUMMARY_OPEN = "<SUMMARY>"
+_SUMMARY_CLOSE = "</SUMMARY>"
+
+# appended to the system prompt when a summary is due and the context
+# manager asked for it to come back with the next reply
+INLINE_SUMMARY_PROMPT = (
+    "The conversation is getting long. Right after the [HYPOTHESIS: ...] line, "
+    "summarize the conversation so far in a few bullet points (goals, progress, "
+    "blockers) wrapped in <SUMMARY>...</SUMMARY>, then answer as usual."
+)
+
+# compact request bodies: no whitespace after separators, no \u escapes
+_DUMPS = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False).encode
+
+
+def _encode_body(payload):
+    """Serialize a payload to UTF-8 JSON bytes, with orjson when available.
+
+    Text that can't be encoded (a lone surrogate from badly decoded
+    input) raises RequestException, like any other failed request.
+    """
+
+    try:
+        if orjson is not None:
+            return orjson.dumps(payload)
+        return _DUMPS(payload).encode("utf-8")
+    except (UnicodeEncodeError, TypeError) as exc:
+        # orjson.JSONEncodeError is a TypeError
+        raise requests.RequestException(f"invalid request body: {exc}")
+
+
+def _decode_body(raw):
+    """Parse a JSON response body, with orjson when available."""
+
+    try:
+        if orjson is not None:
+            return orjson.loads(raw)
+        return json.loads(raw)
+    except ValueError as exc:
+        raise requests.RequestException(f"invalid JSON response: {exc}")
+
+
+# LocalProvider hypotheses, checked in order against the lowered prompt
+_LOCAL_HYPOTHESES = (
+    ("bug", "User is debugging code"),
+    ("doc", "User needs documentation"),
+)
+
+# plain role strings for payloads, avoids going through the enum per message
+_ROLE_STR = {role: role.value for role in Role}
+
+ANTHROPIC_SUMMARY_PROMPT = (
+    "Summarize the following engineering conversation in a few bullet points "
+    "(goals, progress, blockers)."
+)
+
+OPENAI_SUMMARY_PROMPT = (
+    "Summarize this coding session (goal, current status, next steps) in <= 5 bullet points."
+)
+
+# shared by every OpenAI summary payload, never mutated
+_OPENAI_SUMMARY_ENTRY = {"role": "system", "content": OPENAI_SUMMARY_PROMPT}
 
 DEFAULT_TIMEOUT = 60
 
+# seconds to wait for the TCP/TLS connection, DEFAULT_TIMEOUT covers the reply
+CONNECT_TIMEOUT = 5
+
+# transient failures (rate limits, overloaded upstream) are retried with
+# exponential backoff; Retry-After is honored when the API sends one
+MAX_RETRIES = 5
+RETRY_BACKOFF = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# seconds between batch status checks, doubled after every check
+BATCH_POLL_INTERVAL = 5
+BATCH_POLL_MAX_INTERVAL = 60
+
+
+def _build_session():
+    """Return a keep-alive session that retries transient API errors.
+
+    Read errors are not retried: by then the request may already have
+    been processed (and billed) by the provider.
+    """
+
+    retry = Retry(
+        total=MAX_RETRIES,
+        read=0,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=None,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    return session
+
+
+def _enable_retry_logging():
+    """Print urllib3's retry messages, used in debug mode."""
+
+    logger = logging.getLogger("urllib3.util.retry")
+    if logger.handlers:
+        return
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("[retry] %(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG)
+
 
 class AIProvider(object):
     """Base class that handles the common request/response cycle.
@@ -31,8 +154,11 @@ class AIProvider(object):
     the request, parsing hypotheses, updating state, happens here.
     """
 
+    # whether a due summary can be requested as part of a normal reply
+    supports_inline_summary = False
+
     def __init__(self, name, api_url=None, api_key=None, model=None,
-                 max_tokens=4096, timeout=DEFAULT_TIMEOUT, debug=False):
+                 max_tokens=4096, timeout=DEFAULT_TIMEOUT, debug=False, cache=None):
         self.name = name
         self.api_url = api_url
         self.api_key = api_key
@@ -40,12 +166,39 @@ class AIProvider(object):
         self.max_tokens = max_tokens
         self.timeout = timeout
         self.debug = debug
+        self.cache = cache
+
+        # keep-alive session, reuses the TCP+TLS connection across turns
+        self._session = _build_session()
+        if debug:
+            _enable_retry_logging()
+
+        # payload dicts built on the previous turn, keyed by message seq
+        self._entry_cache = {}
+
+    @property
+    def api_key(self):
+        return self._api_key
+
+    @api_key.setter
+    def api_key(self, value):
+        self._api_key = value
+
+        # headers are static for the session and sent with every request;
+        # rebuild them only when the key changes
+        if getattr(self, "_session", None) is not None:
+            self._session.headers.update(self._api_headers())
 
     def _api_headers(self):
         """Return provider-specific HTTP headers."""
 
         raise NotImplementedError
 
+    def close(self):
+        """Release the pooled connections."""
+
+        self._session.close()
+
     def _build_payload(self, context_manager):
         """Transform internal messages into provider-specific payload."""
 
@@ -61,34 +214,205 @@ class AIProvider(object):
 
         raise NotImplementedError
 
+    def _build_payload_with_summary_request(self, context_manager):
+        """Build the usual payload plus the instruction to open the
+        reply with a <SUMMARY> block."""
+
+        payload = self._build_payload(context_manager)
+        self._add_system_note(payload, INLINE_SUMMARY_PROMPT)
+        return payload
+
+    def _add_system_note(self, payload, text):
+        """Append an extra system instruction to a built payload."""
+
+        raise NotImplementedError
+
+    def _build_entry(self, message):
+        """Return the payload dict for a single chat message."""
+
+        return {
+            "role": _ROLE_STR[message.role],
+            "content": message.content,
+        }
+
+    def _cached_entry(self, message, entries):
+        """Return the payload dict for ``message``, reusing the one
+        built on an earlier turn. Every entry used is recorded in
+        ``entries``, which becomes the cache for the next turn."""
+
+        cached = self._entry_cache.get(message.seq)
+        if cached is not None and cached[0] is message:
+            entry = cached[1]
+        else:
+            entry = self._build_entry(message)
+
+        if message.seq is not None:
+            entries[message.seq] = (message, entry)
+
+        return entry
+
+    def _iter_stream_text(self, response):
+        """Yield reply text fragments from a streamed response."""
+
+        raise NotImplementedError
+
+    def _iter_sse_events(self, response):
+        """Yield the decoded JSON of every ``data:`` line in an SSE stream."""
+
+        for line in response.iter_lines():
+            if not line.startswith(b"data:"):
+                continue
+
+            data = line[5:].strip()
+            if data == b"[DONE]":
+                return
+
+            yield _decode_body(data)
+
     def _print_debug(self, label, content):
         """Print debug information when enabled."""
 
         if not self.debug:
             return
 
+        buffer = getattr(sys.stdout, "buffer", None)
+
         try:
-            payload = json.dumps(content, indent=2, ensure_ascii=False)
+            if orjson is not None:
+                payload = orjson.dumps(
+                    content, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+                )
+                if buffer is not None:
+                    # write the bytes as-is, no decode/re-encode round trip;
+                    # flush first so earlier print() output stays in order
+                    sys.stdout.flush()
+                    buffer.write(f"[{self.name} {label}] ".encode("utf-8") + payload + b"\n")
+                    buffer.flush()
+                    return
+                payload = payload.decode("utf-8")
+            else:
+                payload = json.dumps(content, indent=2, ensure_ascii=False)
         except TypeError:
             payload = str(content)
 
         print(f"[{self.name} {label}] {payload}")
 
-    def _extract_hypothesis(self, text):
+    def _extract_hypothesis(self, text, keep_trailing=False):
         """Extract and strip the [HYPOTHESIS: ...] line from a reply.
 
+        With ``keep_trailing`` only leading whitespace is removed, for
+        a streamed fragment that more text will follow.
+
         Returns:
             tuple: (hypothesis, cleaned_text). Hypothesis is empty string
                    if the tag was not found.
         """
 
+        strip = str.lstrip if keep_trailing else str.strip
+
+        # the system prompt asks for the tag on the first line
+        if text.startswith(_HYPOTHESIS_TAG):
+            match = _HYPOTHESIS_RE.match(text)
+            if match:
+                return match.group(1).strip(), strip(text[match.end():])
+
+        # some replies put a preamble before it; the tag still has to
+        # start a line, inline mentions are left alone
+        if _HYPOTHESIS_TAG not in text:
+            return "", text
+
         match = _HYPOTHESIS_RE.search(text)
         if not match:
             return "", text
 
         hypothesis = match.group(1).strip()
         cleaned = text[:match.start()] + text[match.end():]
-        return hypothesis, cleaned.strip()
+        return hypothesis, strip(cleaned)
+
+    def _extract_summary(self, text, keep_trailing=False):
+        """Extract and strip the <SUMMARY>...</SUMMARY> block from a reply.
+
+        ``keep_trailing`` works as in _extract_hypothesis().
+
+        Returns:
+            tuple: (summary, cleaned_text). Summary is empty string
+                   if the block was not found.
+        """
+
+        start = text.find(_SUMMARY_OPEN)
+        if start == -1:
+            return "", text
+
+        end = text.find(_SUMMARY_CLOSE, start)
+        if end == -1:
+            return "", text
+
+        summary = text[start + len(_SUMMARY_OPEN):end].strip()
+        cleaned = text[:start] + text[end + len(_SUMMARY_CLOSE):].lstrip()
+        return summary, cleaned.lstrip() if keep_trailing else cleaned.strip()
+
+    def _take_inline_summary(self, text, context_manager, state_manager, keep_trailing=False):
+        """Apply the summary found in ``text``, if any, and return the
+        reply without it. Without one, the context manager falls back
+        to a separate summarize() call on the next turn."""
+
+        summary, cleaned = self._extract_summary(text, keep_trailing)
+        if summary:
+            context_manager.apply_summary(summary, state_manager)
+
+        return cleaned
+
+    def _holding_preamble(self, head, want_summary):
+        """Return True while the start of a streamed reply may still be
+        the hypothesis line (or the summary block, when requested)."""
+
+        if len(head) < len(_HYPOTHESIS_TAG) and _HYPOTHESIS_TAG.startswith(head):
+            return True
+
+        if head.startswith(_HYPOTHESIS_TAG):
+            newline = head.find("\n")
+            if newline == -1:
+                return True
+            head = head[newline + 1:].lstrip()
+
+        if not want_summary:
+            return False
+
+        if len(head) < len(_SUMMARY_OPEN):
+            return _SUMMARY_OPEN.startswith(head)
+
+        return head.startswith(_SUMMARY_OPEN) and _SUMMARY_CLOSE not in head
+
+    def _post(self, payload):
+        """Send ``payload`` to the API and return the decoded response.
+
+        When a response cache is configured, an identical payload sent
+        earlier is answered from the cache without touching the network.
+        """
+
+        # encoded first: a payload that can't be sent fails here with
+        # RequestException instead of inside cache_key()
+        body = _encode_body(payload)
+
+        key = None
+        if self.cache is not None:
+            key = cache_key(payload)
+            data = self.cache.get(key)
+            if data is not None:
+                return data
+
+        response = self._session.post(
+            self.api_url,
+            data=body,
+            timeout=(CONNECT_TIMEOUT, self.timeout),
+        )
+        response.raise_for_status()
+        data = _decode_body(response.content)
+
+        if key is not None:
+            self.cache.set(key, data)
+
+        return data
 
     def generate(self, context_manager, state_manager):
         """Run one full turn: build the payload, call the API, parse the
@@ -97,31 +421,39 @@ class AIProvider(object):
         if not self.api_key:
             return f"{self.name} provider requires an API key"
 
-        payload = self._build_payload(context_manager)
+        want_summary = self.supports_inline_summary and context_manager.pending_summary
+        if want_summary:
+            payload = self._build_payload_with_summary_request(context_manager)
+        else:
+            payload = self._build_payload(context_manager)
 
         if self.debug:
             self._print_debug("request", payload)
 
         try:
-            response = requests.post(
-                self.api_url,
-                headers=self._api_headers(),
-                json=payload,
-                timeout=self.timeout,
-            )
-            response.raise_for_status()
-            data = response.json()
+            data = self._post(payload)
 
             if self.debug:
                 self._print_debug("response", data)
         except requests.RequestException as exc:
             return f"{self.name} request failed: {exc}"
 
+        completion = self._parse_completion(data, state_manager)
+        if want_summary:
+            completion = self._take_inline_summary(completion, context_manager, state_manager)
+            completion = completion or f"{self.name}: no action or response"
+
         summary = context_manager.summarized_context()
         if summary:
             state_manager.set_summary(summary)
 
         state_manager.add_action(f"reply via {self.name}")
+        return completion
+
+    def _parse_completion(self, data, state_manager):
+        """Pull the reply text out of a response body and record its
+        hypothesis, if any."""
+
         completion = self._extract_text(data)
 
         if not completion:
@@ -133,6 +465,86 @@ class AIProvider(object):
 
         return completion
 
+    def generate_stream(self, context_manager, state_manager):
+        """Like generate(), but yields the reply in fragments as the
+        provider streams it back.
+
+        The leading [HYPOTHESIS: ...] line (and a requested <SUMMARY>
+        block) is held back until it is complete, so it is stored but
+        never shown to the user.
+        """
+
+        if not self.api_key:
+            yield f"{self.name} provider requires an API key"
+            return
+
+        want_summary = self.supports_inline_summary and context_manager.pending_summary
+        if want_summary:
+            payload = self._build_payload_with_summary_request(context_manager)
+        else:
+            payload = self._build_payload(context_manager)
+        payload["stream"] = True
+
+        if self.debug:
+            self._print_debug("request", payload)
+
+        parts = []
+        pending = ""
+        hypothesis = ""
+        streaming = False
+
+        try:
+            with self._session.post(
+                self.api_url,
+                data=_encode_body(payload),
+                timeout=(CONNECT_TIMEOUT, self.timeout),
+                stream=True,
+            ) as response:
+                response.raise_for_status()
+
+                for piece in self._iter_stream_text(response):
+                    parts.append(piece)
+
+                    if streaming:
+                        yield piece
+                        continue
+
+                    # hold fragments back while they may still be the preamble
+                    pending += piece
+                    head = pending.lstrip()
+                    if self._holding_preamble(head, want_summary):
+                        continue
+
+                    streaming = True
+                    # more pieces follow, so keep this one's trailing newlines
+                    hypothesis, cleaned = self._extract_hypothesis(head, keep_trailing=True)
+                    if want_summary:
+                        cleaned = self._take_inline_summary(
+                            cleaned, context_manager, state_manager, keep_trailing=True
+                        )
+                    if cleaned:
+                        yield cleaned
+        except requests.RequestException as exc:
+            yield f"{self.name} request failed: {exc}"
+            return
+
+        if not streaming:
+            hypothesis, cleaned = self._extract_hypothesis(pending.strip())
+            if want_summary:
+                cleaned = self._take_inline_summary(cleaned, context_manager, state_manager)
+            yield cleaned or f"{self.name}: no action or response"
+
+        if self.debug:
+            self._print_debug("response", "".join(parts))
+
+        summary = context_manager.summarized_context()
+        if summary:
+            state_manager.set_summary(summary)
+
+        state_manager.add_action(f"reply via {self.name}")
+        if hypothesis:
+            state_manager.set_hypothesis(hypothesis)
+
     def summarize(self, messages):
         """Condense a list of messages into a short summary string.
         Used by ContextManager when the conversation gets too long."""
@@ -147,19 +559,67 @@ class AIProvider(object):
         payload = self._build_summary_payload(transcript)
 
         try:
-            response = requests.post(
-                self.api_url,
-                headers=self._api_headers(),
-                json=payload,
-                timeout=self.timeout,
-            )
-            response.raise_for_status()
-            data = response.json()
+            data = self._post(payload)
         except requests.RequestException:
             return ""
 
         return self._extract_text(data)
 
+    def batch_entries(self, context_manager, prompts):
+        """Build one ``(custom_id, payload)`` entry per prompt, each as
+        if the prompt was the next user message of the conversation."""
+
+        entries = []
+        for index, prompt in enumerate(prompts, 1):
+            scratch = context_manager.fork()
+            scratch.add_message(Role.USER, prompt)
+            entries.append((f"prompt-{index}", self._build_payload(scratch)))
+
+        return entries
+
+    def submit_batch(self, entries):
+        """Submit ``[(custom_id, payload), ...]`` to the provider's
+        Batch API and return the batch id."""
+
+        raise NotImplementedError
+
+    def _batch_output(self, batch_id):
+        """Return ``{custom_id: body}`` once a batch has finished, or
+        None while it is still processing. Requests that failed map to
+        an error string instead of a response body."""
+
+        raise NotImplementedError
+
+    def collect_batch(self, batch_id, state_manager):
+        """Return ``{custom_id: reply}`` for a finished batch, or None
+        if the provider is still working on it."""
+
+        output = self._batch_output(batch_id)
+        if output is None:
+            return None
+
+        replies = {}
+        for custom_id, data in output.items():
+            if isinstance(data, str):
+                replies[custom_id] = f"{self.name} batch request failed: {data}"
+            else:
+                replies[custom_id] = self._parse_completion(data, state_manager)
+
+        state_manager.add_action(f"batch {batch_id} via {self.name}")
+        return replies
+
+    def poll_batch(self, batch_id, state_manager,
+                   interval=BATCH_POLL_INTERVAL, max_interval=BATCH_POLL_MAX_INTERVAL):
+        """Wait for a batch to finish, backing off between status checks."""
+
+        while True:
+            replies = self.collect_batch(batch_id, state_manager)
+            if replies is not None:
+                return replies
+
+            time.sleep(interval)
+            interval = min(interval * 2, max_interval)
+
 
 class LocalProvider(AIProvider):
     """Offline provider that returns fake responses without calling
@@ -176,7 +636,7 @@ class LocalProvider(AIProvider):
 
         lines = transcript.splitlines()
         goal = next((line for line in lines if line.startswith("user")), "")
-        recent = lines[-1] if lines else ""
+        recent = lines[-1]
         summary_parts = ["Local summary:"]
 
         if goal:
@@ -206,11 +666,16 @@ class LocalProvider(AIProvider):
 
         return reply
 
+    def generate_stream(self, context_manager, state_manager):
+        """Yield the heuristic reply in one piece."""
+
+        yield self.generate(context_manager, state_manager)
+
     def _latest_user_message(self, messages):
         """Return the most recent user content."""
 
         for msg in reversed(messages):
-            if msg.role == Role.USER:
+            if msg.role is Role.USER:
                 return msg.content.strip()
 
         return ""
@@ -221,11 +686,10 @@ class LocalProvider(AIProvider):
         if not prompt:
             return "Awaiting user direction"
 
-        if "bug" in prompt.lower():
-            return "User is debugging code"
-
-        if "doc" in prompt.lower():
-            return "User needs documentation"
+        lowered = prompt.lower()
+        for keyword, hypothesis in _LOCAL_HYPOTHESES:
+            if keyword in lowered:
+                return hypothesis
 
         return "User is iterating on a coding task"
 
@@ -234,12 +698,12 @@ class LocalProvider(AIProvider):
 
         base = prompt or "Thanks for checking in."
         summary = state_manager.summary or "No summary yet"
-        response = []
-        response.append(f"I captured your request: {base}")
-        response.append(f"Hypothesis: {state_manager.hypothesis}")
-        response.append(f"Context summary: {summary}")
-        response.append("Let me know the next step or share more detail.")
-        return "\n".join(response)
+        return "\n".join((
+            f"I captured your request: {base}",
+            f"Hypothesis: {state_manager.hypothesis}",
+            f"Context summary: {summary}",
+            "Let me know the next step or share more detail.",
+        ))
 
 
 class AnthropicProvider(AIProvider):
@@ -247,18 +711,23 @@ class AnthropicProvider(AIProvider):
     into the separate 'system' field that Anthropic expects, and puts
     the rest in the 'messages' array."""
 
+    supports_inline_summary = True
+
     def __init__(
-        self, api_key=None, model="claude-3-haiku-20240307", max_tokens=4096, debug=False
+        self, api_key=None, model="claude-3-haiku-20240307", max_tokens=4096, debug=False,
+        prompt_cache=True, cache=None,
     ):
         super(AnthropicProvider, self).__init__(
             "anthropic", "https://api.anthropic.com/v1/messages",
             api_key,
             model, max_tokens,
-            debug=debug
+            debug=debug, cache=cache,
         )
         self.api_key = api_key or os.environ.get("ANTHROPIC_API_KEY")
         self.model = model
         self.max_tokens = max_tokens
+        self.prompt_cache = prompt_cache
+        self._system_block_cache = None
 
     def _api_headers(self):
         return {
@@ -271,31 +740,39 @@ class AnthropicProvider(AIProvider):
         return {
             "model": self.model,
             "max_tokens": min(4096, self.max_tokens),
-            "system": "Summarize the following engineering conversation in a few bullet points (goals, progress, blockers).",
+            "system": ANTHROPIC_SUMMARY_PROMPT,
             "messages": [
                 {
-                    "role": Role.USER,
+                    "role": "user",
                     "content": [{"type": "text", "text": transcript}],
                 }
             ],
         }
 
     def _build_payload(self, context_manager):
-        """Transform internal messages into Anthropic payload."""
+        """Transform internal messages into Anthropic payload.
+
+        With ``prompt_cache`` enabled, the stable system prompt and the
+        end of the conversation are marked as cache breakpoints, so the
+        next turn only pays full input price for the new messages. The
+        summary block changes on every summarization and is left out
+        of the cached prefix.
+        """
 
-        messages = context_manager.context_slice(ContextManager.MODE_SUMMARY_PLUS_RECENT)
+        system_text = context_manager.system_text()
 
-        system_parts = []
+        summary_parts = []
         chat_messages = []
+        entries = {}
 
-        for message in messages:
-            if message.role == Role.SYSTEM:
-                system_parts.append(message.content)
-            else:
-                chat_messages.append({
-                    "role": message.role,
-                    "content": message.content,
-                })
+        # plain system messages are already joined in system_text
+        for message in context_manager.iter_payload_messages():
+            if message.role is not Role.SYSTEM:
+                chat_messages.append(self._cached_entry(message, entries))
+            elif message.kind == SUMMARY_MSG_KIND:
+                summary_parts.append(message.content)
+
+        self._entry_cache = entries
 
         payload = {
             "model": self.model,
@@ -303,11 +780,56 @@ class AnthropicProvider(AIProvider):
             "messages": chat_messages,
         }
 
-        if system_parts:
-            payload["system"] = "\n".join(system_parts)
+        if not self.prompt_cache:
+            system = "\n".join(filter(None, [system_text, *summary_parts]))
+            if system:
+                payload["system"] = system
+            return payload
+
+        system_blocks = []
+        if system_text:
+            system_blocks.append(self._system_block(system_text))
+        if summary_parts:
+            system_blocks.append({"type": "text", "text": "\n".join(summary_parts)})
+        if system_blocks:
+            payload["system"] = system_blocks
+
+        if chat_messages and chat_messages[-1]["content"]:
+            # copy, the cached entry must stay a plain message next turn
+            last = dict(chat_messages[-1])
+            last["content"] = [{
+                "type": "text",
+                "text": last["content"],
+                "cache_control": {"type": "ephemeral"},
+            }]
+            chat_messages[-1] = last
 
         return payload
 
+    def _add_system_note(self, payload, text):
+        system = payload.get("system")
+        if isinstance(system, list):
+            system.append({"type": "text", "text": text})
+        elif system:
+            payload["system"] = f"{system}\n{text}"
+        else:
+            payload["system"] = text
+
+    def _system_block(self, text):
+        """Return the cacheable system block for ``text``, reusing the
+        previous one while the system prompt is unchanged."""
+
+        cached = self._system_block_cache
+        if cached is None or cached[0] is not text:
+            cached = (text, {
+                "type": "text",
+                "text": text,
+                "cache_control": {"type": "ephemeral"},
+            })
+            self._system_block_cache = cached
+
+        return cached[1]
+
     def _extract_text(self, data):
         """Extract reply text from Anthropic response."""
 
@@ -319,21 +841,89 @@ class AnthropicProvider(AIProvider):
 
         return ""
 
+    def submit_batch(self, entries):
+        """Submit payloads to the Message Batches API."""
+
+        response = self._session.post(
+            f"{self.api_url}/batches",
+            json={
+                "requests": [
+                    {"custom_id": custom_id, "params": payload}
+                    for custom_id, payload in entries
+                ],
+            },
+            timeout=(CONNECT_TIMEOUT, self.timeout),
+        )
+        response.raise_for_status()
+        return response.json()["id"]
+
+    def _batch_output(self, batch_id):
+        """Fetch the results of a Message Batch once it has ended."""
+
+        response = self._session.get(
+            f"{self.api_url}/batches/{batch_id}",
+            timeout=(CONNECT_TIMEOUT, self.timeout),
+        )
+        response.raise_for_status()
+        batch = response.json()
+
+        if batch.get("processing_status") != "ended":
+            return None
+
+        response = self._session.get(
+            batch["results_url"],
+            timeout=(CONNECT_TIMEOUT, self.timeout),
+        )
+        response.raise_for_status()
+
+        output = {}
+        for line in response.text.splitlines():
+            if not line.strip():
+                continue
+
+            entry = _decode_body(line)
+            result = entry.get("result") or {}
+            if result.get("type") == "succeeded":
+                output[entry["custom_id"]] = result.get("message") or {}
+            else:
+                output[entry["custom_id"]] = result.get("type") or "unknown error"
+
+        return output
+
+    def _iter_stream_text(self, response):
+        """Yield text deltas from an Anthropic event stream."""
+
+        for event in self._iter_sse_events(response):
+            event_type = event.get("type")
+
+            if event_type == "content_block_delta":
+                delta = event.get("delta") or {}
+                if delta.get("type") == "text_delta" and delta.get("text"):
+                    yield delta["text"]
+            elif event_type == "error":
+                error = event.get("error") or {}
+                raise requests.RequestException(error.get("message") or "stream error")
+            elif event_type == "message_stop":
+                return
+
 
 class OpenAIProvider(AIProvider):
     """Talks to the OpenAI Chat Completions API. Everything goes
     into a flat 'messages' array, system messages included."""
 
+    supports_inline_summary = True
+
     def __init__(
-        self, api_key=None, model="gpt-4o-mini", max_tokens=4096, debug=False
+        self, api_key=None, model="gpt-4o-mini", max_tokens=4096, debug=False, cache=None
     ):
         super(OpenAIProvider, self).__init__(
             "openai", "https://api.openai.com/v1/chat/completions",
             api_key,
             model, max_tokens,
-            debug=debug,
+            debug=debug, cache=cache,
         )
         self.api_key = api_key or os.environ.get("OPENAI_API_KEY")
+        self.api_base = "https://api.openai.com/v1"
         self.model = model
         self.max_tokens = max_tokens
 
@@ -348,28 +938,20 @@ class OpenAIProvider(AIProvider):
             "model": self.model,
             "max_tokens": min(4096, self.max_tokens),
             "messages": [
-                {
-                    "role": Role.SYSTEM,
-                    "content": "Summarize this coding session (goal, current status, next steps) in <= 5 bullet points.",
-                },
-                {"role": Role.USER, "content": transcript},
+                _OPENAI_SUMMARY_ENTRY,
+                {"role": "user", "content": transcript},
             ],
         }
 
     def _build_payload(self, context_manager):
         """Transform internal messages into OpenAI payload."""
 
-        messages = context_manager.context_slice(ContextManager.MODE_SUMMARY_PLUS_RECENT)
-
-        chat_messages = []
-        for message in messages:
-            entry = {
-                "role": message.role,
-                "content": message.content,
-            }
-            if message.name:
-                entry["name"] = message.name
-            chat_messages.append(entry)
+        entries = {}
+        chat_messages = [
+            self._cached_entry(message, entries)
+            for message in context_manager.iter_payload_messages()
+        ]
+        self._entry_cache = entries
 
         return {
             "model": self.model,
@@ -377,6 +959,22 @@ class OpenAIProvider(AIProvider):
             "messages": chat_messages,
         }
 
+    def _build_entry(self, message):
+        if message.name:
+            return {
+                "role": _ROLE_STR[message.role],
+                "content": message.content,
+                "name": message.name,
+            }
+
+        return {
+            "role": _ROLE_STR[message.role],
+            "content": message.content,
+        }
+
+    def _add_system_note(self, payload, text):
+        payload["messages"].append({"role": "system", "content": text})
+
     def _extract_text(self, data):
         """Extract reply text from OpenAI response."""
 
@@ -386,3 +984,90 @@ class OpenAIProvider(AIProvider):
 
         message = choices[0].get("message") or {}
         return (message.get("content") or "").strip()
+
+    def submit_batch(self, entries):
+        """Upload the payloads as a JSONL file and start a batch on it."""
+
+        lines = "\n".join(
+            json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": payload,
+            }, ensure_ascii=False)
+            for custom_id, payload in entries
+        )
+
+        response = self._session.post(
+            f"{self.api_base}/files",
+            # let requests set the multipart content-type
+            headers={"content-type": None},
+            data={"purpose": "batch"},
+            files={"file": ("batch.jsonl", lines.encode("utf-8"))},
+            timeout=(CONNECT_TIMEOUT, self.timeout),
+        )
+        response.raise_for_status()
+        file_id = response.json()["id"]
+
+        response = self._session.post(
+            f"{self.api_base}/batches",
+            json={
+                "input_file_id": file_id,
+                "endpoint": "/v1/chat/completions",
+                "completion_window": "24h",
+            },
+            timeout=(CONNECT_TIMEOUT, self.timeout),
+        )
+        response.raise_for_status()
+        return response.json()["id"]
+
+    def _batch_output(self, batch_id):
+        """Download the output file of a batch once it has finished."""
+
+        response = self._session.get(
+            f"{self.api_base}/batches/{batch_id}",
+            timeout=(CONNECT_TIMEOUT, self.timeout),
+        )
+        response.raise_for_status()
+        batch = response.json()
+
+        status = batch.get("status")
+        if status in ("validating", "in_progress", "finalizing", "cancelling"):
+            return None
+
+        output_file_id = batch.get("output_file_id")
+        if status != "completed" or not output_file_id:
+            return {}
+
+        response = self._session.get(
+            f"{self.api_base}/files/{output_file_id}/content",
+            timeout=(CONNECT_TIMEOUT, self.timeout),
+        )
+        response.raise_for_status()
+
+        output = {}
+        for line in response.text.splitlines():
+            if not line.strip():
+                continue
+
+            entry = _decode_body(line)
+            result = entry.get("response") or {}
+            if result.get("status_code") == 200:
+                output[entry["custom_id"]] = result.get("body") or {}
+            else:
+                error = entry.get("error") or {}
+                output[entry["custom_id"]] = error.get("message") or f"status {result.get('status_code')}"
+
+        return output
+
+    def _iter_stream_text(self, response):
+        """Yield content deltas from an OpenAI chunk stream."""
+
+        for chunk in self._iter_sse_events(response):
+            choices = chunk.get("choices") or []
+            if not choices:
+                continue
+
+            delta = choices[0].get("delta") or {}
+            if delta.get("content"):
+                yield delta["content"]
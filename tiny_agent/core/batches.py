@@ -0,0 +1,70 @@
+"""
+    tiny_agent.core.batches
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Keeps track of batch jobs submitted to a provider's Batch API.
+    Batches can take minutes to finish, so pending batch ids are saved
+    to disk together with the prompts they answer; the REPL can pick
+    the results up later, even after a restart.
+
+"""
+
+import json
+import os
+from datetime import datetime, timezone
+
+
+DEFAULT_BATCHES_PATH = os.path.join(os.path.expanduser("~"), ".tiny_agent", "batches.json")
+
+
+class BatchStore(object):
+    """Small JSON file mapping batch ids to the provider that owns
+    them and the prompts that were queued."""
+
+    def __init__(self, path=DEFAULT_BATCHES_PATH):
+        self.path = path
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as handle:
+                return json.load(handle)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, batches):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as handle:
+            json.dump(batches, handle, indent=2, ensure_ascii=False)
+
+    def add(self, provider_name, batch_id, prompts):
+        """Remember a submitted batch.
+
+        Args:
+            provider_name (str): Provider that received the batch.
+            batch_id (str): Id returned by the provider.
+            prompts (dict): custom_id -> user prompt.
+        """
+
+        batches = self._load()
+        batches[batch_id] = {
+            "provider": provider_name,
+            "prompts": prompts,
+            "created": datetime.now(timezone.utc).isoformat(),
+        }
+        self._save(batches)
+
+    def pending(self, provider_name):
+        """Return ``[(batch_id, prompts), ...]`` still waiting for results."""
+
+        return [
+            (batch_id, entry.get("prompts") or {})
+            for batch_id, entry in self._load().items()
+            if entry.get("provider") == provider_name
+        ]
+
+    def remove(self, batch_id):
+        """Forget a batch once its results have been collected."""
+
+        batches = self._load()
+        if batches.pop(batch_id, None) is not None:
+            self._save(batches)
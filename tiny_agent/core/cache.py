@@ -0,0 +1,198 @@
+"""
+    tiny_agent.core.cache
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    Exact-match cache for provider responses. A request payload is
+    hashed into a key; if the same payload was sent before, the stored
+    response is returned instead of calling the API again. Handy while
+    iterating on prompts, where the same question gets asked repeatedly.
+    ResponseCache keeps entries on disk across sessions;
+    MemoryResponseCache only for the lifetime of the process.
+
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".tiny_agent", "cache.db")
+
+# entries older than this are ignored and eventually evicted
+DEFAULT_TTL = 24 * 60 * 60
+
+DEFAULT_MAX_ENTRIES = 500
+
+DEFAULT_MEMORY_ENTRIES = 32
+
+
+def cache_key(payload):
+    """Return a stable hash for a request payload.
+
+    Keys are sorted so dicts built in a different order still hit the
+    same entry. A 128-bit blake2b digest is plenty for a local cache
+    and cheaper than sha256.
+    """
+
+    if orjson is not None:
+        canonical = orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)
+    else:
+        canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+
+    return hashlib.blake2b(canonical, digest_size=16).hexdigest()
+
+
+class ResponseCache(object):
+    """SQLite-backed response cache with a TTL and LRU eviction.
+
+    Every lookup refreshes the entry's ``last_used`` time; when the
+    table grows past ``max_entries`` the least recently used rows are
+    dropped.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        # decoded responses seen in this process, so repeated hits skip
+        # parsing the stored JSON again
+        self._memo = {}
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        """Return the cached response for ``key``, or None on a miss."""
+
+        now = time.time()
+        memo = self._memo.get(key)
+
+        if memo is not None:
+            created, data = memo
+        else:
+            row = self._conn.execute(
+                "SELECT data, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                return None
+
+            data, created = None, row[1]
+            raw = row[0]
+
+        if now - created > self.ttl:
+            self._memo.pop(key, None)
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._conn.commit()
+            return None
+
+        self._conn.execute(
+            "UPDATE responses SET last_used = ? WHERE key = ?", (now, key)
+        )
+        self._conn.commit()
+
+        if data is None:
+            data = json.loads(raw)
+            self._remember(key, created, data)
+
+        return data
+
+    def set(self, key, data):
+        """Store a response and evict expired or least recently used rows."""
+
+        now = time.time()
+        self._remember(key, now, data)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO responses (key, data, created, last_used)"
+            " VALUES (?, ?, ?, ?)",
+            (key, json.dumps(data, ensure_ascii=False), now, now),
+        )
+        self._conn.execute(
+            "DELETE FROM responses WHERE created < ?", (now - self.ttl,)
+        )
+        self._conn.execute(
+            "DELETE FROM responses WHERE key NOT IN"
+            " (SELECT key FROM responses ORDER BY last_used DESC LIMIT ?)",
+            (self.max_entries,),
+        )
+        self._conn.commit()
+
+    def _remember(self, key, created, data):
+        if len(self._memo) >= self.max_entries:
+            self._memo.clear()
+
+        self._memo[key] = (created, data)
+
+    def clear(self):
+        """Drop every cached response."""
+
+        self._memo.clear()
+        self._conn.execute("DELETE FROM responses")
+        self._conn.commit()
+
+    def close(self):
+        """Close the underlying database connection."""
+
+        self._conn.close()
+
+
+class MemoryResponseCache(object):
+    """In-process LRU response cache with the same interface as
+    ResponseCache. Nothing is written to disk, so it suits retries
+    and repeated prompts within a single session."""
+
+    def __init__(self, max_entries=DEFAULT_MEMORY_ENTRIES, ttl=DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """Return the cached response for ``key``, or None on a miss."""
+
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        created, data = entry
+        if time.time() - created > self.ttl:
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return data
+
+    def set(self, key, data):
+        """Store a response, dropping the least recently used one when full."""
+
+        self._entries[key] = (time.time(), data)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every cached response."""
+
+        self._entries.clear()
+
+    def close(self):
+        """Nothing to release; kept for parity with ResponseCache."""
@@ -2,7 +2,7 @@
     tiny_agent.core.context
     ~~~~~~~~~~~~~~~~~~~~~~~
 
-    Holds the conversation history as a list of Message objects. When
+    Holds the conversation history as Message objects. When
     the history gets too long (too many turns or too many tokens), it
     asks the provider to summarize the older messages and keeps only
     the recent ones. Providers never read the message list directly,
@@ -10,10 +10,12 @@
 
 """
 
-import json
+import copy
+from collections import deque
+from itertools import islice
 
-from .messages import Message, Role
-from .utils import approx_token_count
+from .messages import SUMMARY_MSG_KIND, Message, Role
+from .utils import approx_token_count, dumps_pretty
 
 
 SYSTEM_PROMPT = (
@@ -59,7 +61,8 @@ class ContextManager(object):
     MODE_SUMMARY_PLUS_RECENT = 3
 
     def __init__(
-        self, max_turns=MAX_TURNS, token_limit=TOKEN_LIMIT, keep_recent=MESSAGES_AFTER_SUMMARIZATION
+        self, max_turns=MAX_TURNS, token_limit=TOKEN_LIMIT, keep_recent=MESSAGES_AFTER_SUMMARIZATION,
+        inline_summary=False,
     ):
         self.max_turns = max_turns if max_turns >= 1 else MAX_TURNS
         self.keep_recent = keep_recent if keep_recent >= 1 else MESSAGES_AFTER_SUMMARIZATION
@@ -73,42 +76,102 @@ class ContextManager(object):
 
         self.token_limit += approx_token_count(SYSTEM_PROMPT) + 150  # add some buffer for the system prompt and summary header
 
-        self.messages = []
+        # system messages (prompt + summary) and chat turns are kept
+        # apart, so trimming old turns is a popleft instead of a rebuild
+        self._system_messages = []
+        self._chat_messages = deque()
         self.summary = ""
+        self._next_seq = 0
+
+        # joined system prompt text, rebuilt only when a system message is added
+        self._system_text = None
+
+        # with inline_summary, a due summary is asked for as part of the
+        # next reply instead of with a separate request; pending_summary
+        # stays set until apply_summary() receives it
+        self.inline_summary = inline_summary
+        self.pending_summary = False
+
+        # running totals over non-system messages, so the summarization
+        # check doesn't re-count the whole history every turn
+        self._chat_count = 0
+        self._chat_tokens = 0
+
+        # context_slice() results keyed by (mode, limit), cleared whenever
+        # the messages or the summary change
+        self._slice_cache = {}
 
     def add_message(self, role, content):
         """Append a normalized message to the context."""
 
         message = Message(role=role, content=content)
-        self.messages.append(message)
+        message.seq = self._next_seq
+        self._next_seq += 1
+
+        if message.role is Role.SYSTEM:
+            self._system_messages.append(message)
+            self._system_text = None
+        else:
+            self._chat_messages.append(message)
+            self._chat_count += 1
+            self._chat_tokens += message.tokens
+
+        self._slice_cache.clear()
         return message
 
+    @property
+    def messages(self):
+        """All messages, system messages first, as a new list."""
+
+        return self._system_messages + list(self._chat_messages)
+
     def get_context(self):
         """Return the full context as Message instances."""
 
-        return list(self.messages)
+        return self.messages
 
     def recent_messages(self, limit=MESSAGES_AFTER_SUMMARIZATION):
-        """Return the last ``limit`` non-system messages."""
+        """Return the last ``limit`` non-system messages, or all of them
+        when ``limit`` is None."""
 
-        recent = [msg for msg in self.messages if msg.role != Role.SYSTEM]
-        return list(recent[-limit:])
+        recent = list(islice(reversed(self._chat_messages), limit))
+        recent.reverse()
+        return recent
 
     def summary_plus_recent(self, limit=MESSAGES_AFTER_SUMMARIZATION):
         """Return system prompt, summary block (if any), and recent messages."""
 
-        system_msgs = [msg for msg in self.messages if msg.role == Role.SYSTEM
-                       and not msg.content.startswith("## Conversation Summary")]
+        system_msgs, recent = self._split_recent(limit)
 
-        result = list(system_msgs)
+        # maybe_summarize() stores the summary message; only build one
+        # when the summary was set some other way
+        if self.summary and not any(msg.kind == SUMMARY_MSG_KIND for msg in system_msgs):
+            system_msgs.append(self._summary_message())
 
-        if self.summary:
-            result.append(
-                Message(Role.SYSTEM, f"## Conversation Summary\n{self.summary}")
+        return system_msgs + recent
+
+    def system_text(self):
+        """Return the system messages (without the summary) joined into
+        one string. The result is cached until another system message
+        is added, so providers don't re-join the prompt every turn."""
+
+        if self._system_text is None:
+            self._system_text = "\n".join(
+                msg.content for msg in self._system_messages if msg.kind != SUMMARY_MSG_KIND
             )
 
-        result.extend(self.recent_messages(limit))
-        return result
+        return self._system_text
+
+    def _split_recent(self, limit):
+        """Return the system messages and the last ``limit`` chat
+        messages, both in order."""
+
+        return list(self._system_messages), self.recent_messages(limit)
+
+    def _summary_message(self):
+        return Message(
+            Role.SYSTEM, f"## Conversation Summary\n{self.summary}", kind=SUMMARY_MSG_KIND
+        )
 
     def context_slice(self, mode=MODE_FULL, limit=CONTEXT_WINDOW):
         """Return a message list sliced according to ``mode``.
@@ -117,20 +180,117 @@ class ContextManager(object):
             MODE_FULL                – all messages as stored.
             MODE_RECENT              – system messages + last ``limit`` chat turns.
             MODE_SUMMARY_PLUS_RECENT – system prompt + summary + last ``limit`` turns.
+
+        Slices are cached until the next add_message() or summarization,
+        so repeated calls within a turn don't walk the history again.
         """
 
+        key = (mode, limit)
+        cached = self._slice_cache.get(key)
+        if cached is None:
+            cached = self._build_slice(mode, limit)
+            self._slice_cache[key] = cached
+
+        return list(cached)
+
+    def _build_slice(self, mode, limit):
         if mode == self.MODE_FULL:
-            return list(self.messages)
+            return self.messages
 
         if mode == self.MODE_RECENT:
-            system_msgs = [msg for msg in self.messages if msg.role == Role.SYSTEM]
-            return system_msgs + self.recent_messages(limit)
+            system_msgs, recent = self._split_recent(limit)
+            return system_msgs + recent
 
         if mode == self.MODE_SUMMARY_PLUS_RECENT:
             return self.summary_plus_recent(limit)
 
         raise ValueError(f"Unknown context slice mode: {mode}")
 
+    def compile(self, budget_tokens=None, limit=CONTEXT_WINDOW):
+        """Return a summary+recent slice that fits in ``budget_tokens``.
+
+        Items are kept by priority: system prompt, latest message,
+        summary, then older chat turns from newest to oldest. A turn is
+        a user message plus the replies after it, kept or dropped as a
+        whole so the history never opens on a reply. Once a turn doesn't
+        fit, it and everything before it are dropped, so the recent
+        history never has gaps. ``budget_tokens`` defaults to the
+        manager's token_limit.
+        """
+
+        return list(self._compiled(budget_tokens, limit))
+
+    def iter_payload_messages(self, budget_tokens=None, limit=CONTEXT_WINDOW):
+        """Yield the messages of compile() without copying the list.
+
+        Providers walk this once while building their payload. While an
+        inline summary is pending the whole history is sent instead:
+        apply_summary() trims everything but the last few turns, so the
+        model has to see all of them to summarize them.
+        """
+
+        if self.pending_summary:
+            yield from self.summary_plus_recent(None)
+            return
+
+        yield from self._compiled(budget_tokens, limit)
+
+    def _compiled(self, budget_tokens, limit):
+        budget = self.token_limit if budget_tokens is None else budget_tokens
+
+        key = ("compile", budget, limit)
+        cached = self._slice_cache.get(key)
+        if cached is not None:
+            return cached
+
+        system_msgs = []
+        summary_msgs = []
+        chat_msgs = []
+        for msg in self.summary_plus_recent(limit):
+            if msg.role is not Role.SYSTEM:
+                chat_msgs.append(msg)
+            elif msg.kind == SUMMARY_MSG_KIND:
+                summary_msgs.append(msg)
+            else:
+                system_msgs.append(msg)
+
+        used = sum(msg.tokens for msg in system_msgs)
+
+        kept = []
+        if chat_msgs:
+            kept.append(chat_msgs[-1])
+            used += chat_msgs[-1].tokens
+
+        summary_tokens = sum(msg.tokens for msg in summary_msgs)
+        if used + summary_tokens <= budget:
+            used += summary_tokens
+        else:
+            summary_msgs = []
+
+        # replies before the oldest user message in the window never
+        # complete a turn and are left out
+        turn_tokens = 0
+        turn_start = len(kept)
+        for msg in reversed(chat_msgs[:-1]):
+            kept.append(msg)
+            turn_tokens += msg.tokens
+            if msg.role is not Role.USER:
+                continue
+
+            if used + turn_tokens > budget:
+                break
+
+            used += turn_tokens
+            turn_tokens = 0
+            turn_start = len(kept)
+
+        del kept[turn_start:]
+
+        kept.reverse()
+        result = system_msgs + summary_msgs + kept
+        self._slice_cache[key] = result
+        return result
+
     def summarized_context(self):
         """Return the rolling summary maintained by the manager."""
 
@@ -140,14 +300,30 @@ class ContextManager(object):
         """Print the current context for debugging."""
 
         messages = [msg.to_dict() for msg in self.messages]
-        formatted = json.dumps(messages, indent=2, ensure_ascii=False)
+        formatted = dumps_pretty(messages)
         print(f"[context] {formatted}")
 
+    def fork(self):
+        """Return an independent copy of the conversation, e.g. to
+        build a payload for a prompt without adding it here."""
+
+        clone = copy.copy(self)
+        clone._system_messages = list(self._system_messages)
+        clone._chat_messages = deque(self._chat_messages)
+        clone._slice_cache = {}
+        return clone
+
     def reset(self):
         """Clear all stored messages and summary."""
 
-        self.messages = []
+        self._system_messages = []
+        self._system_text = None
+        self._chat_messages.clear()
         self.summary = ""
+        self.pending_summary = False
+        self._chat_count = 0
+        self._chat_tokens = 0
+        self._slice_cache.clear()
 
     def maybe_summarize(self, provider, state_manager=None):
         """Summarize and trim history when it exceeds limits.
@@ -156,18 +332,17 @@ class ContextManager(object):
         approximate token count exceeds the threshold.  The provider is
         asked to summarize *before* older messages are dropped so that
         context is never silently lost.
+
+        With ``inline_summary`` and a provider that supports it, the
+        summary is requested with the next reply instead. If that reply
+        doesn't include one, the next call summarizes the usual way.
         """
 
         if not provider:
             return
 
-        chat_count = sum(
-            1 for msg in self.messages if msg.role != Role.SYSTEM
-        )
-        token_count = sum(
-            approx_token_count(msg.content)
-            for msg in self.messages if msg.role != Role.SYSTEM
-        )
+        chat_count = self._chat_count
+        token_count = self._chat_tokens
         needs_trim = chat_count > self.max_turns
         needs_summary = self._exceeds_token_threshold()
 
@@ -176,6 +351,16 @@ class ContextManager(object):
                 state_manager.add_context_info(chat_count, token_count, summarized=False)
             return
 
+        if (
+            self.inline_summary
+            and provider.supports_inline_summary
+            and not self.pending_summary
+        ):
+            self.pending_summary = True
+            if state_manager:
+                state_manager.add_context_info(chat_count, token_count, summarized=False)
+            return
+
         summary_text = provider.summarize(self.get_context())
 
         if state_manager:
@@ -187,26 +372,31 @@ class ContextManager(object):
         if not summary_text:
             return
 
+        self.apply_summary(summary_text)
+
+    def apply_summary(self, summary_text, state_manager=None):
+        """Store ``summary_text`` as the rolling summary and trim the
+        history down to the last ``keep_recent`` chat turns."""
+
+        if state_manager:
+            state_manager.add_context_info(
+                self._chat_count, self._chat_tokens, summarized=True,
+            )
+
         self.summary = summary_text
+        self.pending_summary = False
 
-        system_messages = [
-            msg for msg in self.messages
-            if msg.role == Role.SYSTEM and not msg.content.startswith("## Conversation Summary")
-        ]
-        recent = [
-            msg for msg in self.messages[-self.keep_recent:]
-            if msg.role != Role.SYSTEM
+        self._system_messages = [
+            msg for msg in self._system_messages if msg.kind != SUMMARY_MSG_KIND
         ]
-        self.messages = system_messages
-        self.messages.append(
-            Message(Role.SYSTEM, f"## Conversation Summary\n{self.summary}")
-        )
+        self._system_messages.append(self._summary_message())
 
-        self.messages.extend(recent)
+        chat = self._chat_messages
+        while len(chat) > self.keep_recent:
+            self._chat_tokens -= chat.popleft().tokens
+
+        self._chat_count = len(chat)
+        self._slice_cache.clear()
 
     def _exceeds_token_threshold(self):
-        total = sum(
-            approx_token_count(msg.content)
-            for msg in self.messages if msg.role != Role.SYSTEM
-        )
-        return total >= self.token_limit
+        return self._chat_tokens >= self.token_limit
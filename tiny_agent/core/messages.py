@@ -8,22 +8,30 @@
 
 """
 
-from enum import Enum
+from enum import StrEnum
 
+from .utils import approx_token_count
 
-class Role(str, Enum):
-    """The three roles a message can have: system, user, or assistant."""
+
+# Message.kind values. Chat and system messages get their kind from the
+# role; the rolling summary is a system message of its own kind, so
+# filters can skip it without looking at the content.
+CHAT_MSG_KIND = "chat"
+SYSTEM_MSG_KIND = "system"
+SUMMARY_MSG_KIND = "system_summary"
+
+
+class Role(StrEnum):
+    """The three roles a message can have: system, user, or assistant.
+
+    StrEnum members are real strings, so str() and f-strings use the
+    built-in str methods and give the plain value.
+    """
 
     SYSTEM = "system"
     USER = "user"
     ASSISTANT = "assistant"
 
-    def __str__(self):
-        return self.value
-
-    def __format__(self, format_spec):
-        return str.__format__(self.value, format_spec)
-
     @classmethod
     def validate(cls, role):
         """Ensure role is known and return the enum member."""
@@ -31,23 +39,43 @@ class Role(str, Enum):
         if role is None:
             return cls.USER
 
-        if isinstance(role, cls):
+        if role.__class__ is cls:
             return role
 
-        value = str(role)
-        if value not in cls._value2member_map_:
-            raise ValueError(f"Unsupported role: {value}")
+        # plain strings hash like the members' values, so one lookup does
+        try:
+            member = _ROLE_LOOKUP(role)
+        except TypeError:
+            member = None
+
+        if member is None:
+            member = _ROLE_LOOKUP(str(role))
+            if member is None:
+                raise ValueError(f"Unsupported role: {role}")
+
+        return member
 
-        return cls._value2member_map_[value]
+
+_ROLE_LOOKUP = Role._value2member_map_.get
 
 
 class Message(object):
     """A single chat message with a role, content, and optional name."""
 
-    def __init__(self, role, content, name=None):
-        self.role = Role.validate(role)
+    # long sessions keep many of these around, skip the per-instance __dict__
+    __slots__ = ("role", "content", "name", "kind", "seq", "tokens")
+
+    def __init__(self, role, content, name=None, kind=None):
+        # always a Role member, so roles can be compared with ``is``
+        self.role = role if role.__class__ is Role else Role.validate(role)
         self.content = content or ""
         self.name = name
+        if kind is None:
+            kind = SYSTEM_MSG_KIND if self.role is Role.SYSTEM else CHAT_MSG_KIND
+        self.kind = kind
+        # position in the conversation, set by ContextManager.add_message()
+        self.seq = None
+        self.tokens = approx_token_count(self.content)
 
     def to_dict(self):
         """Return a serializable dictionary representation.
@@ -9,15 +9,23 @@
 
 """
 
-import json
 from datetime import datetime, timezone
 
+from .utils import dumps_pretty
+
+
+# bound once, add_action() runs on every turn
+_utcnow = datetime.now
+_UTC = timezone.utc
+
 
 class StateManager(object):
     """Tracks the agent's reasoning state: hypothesis, actions,
     and summary. Passed into every generate() call so providers
     can read and update it."""
 
+    __slots__ = ("hypothesis", "actions", "summary", "context_info")
+
     def __init__(self):
         self.hypothesis = ""
         self.actions = []
@@ -39,8 +47,7 @@ class StateManager(object):
         if not text:
             return
 
-        timestamp = datetime.now(timezone.utc).isoformat()
-        self.actions.append({"text": text, "timestamp": timestamp})
+        self.actions.append({"text": text, "timestamp": _utcnow(_UTC).isoformat()})
 
     def set_summary(self, summary):
         """Persist the latest context summary.
@@ -79,5 +86,5 @@ class StateManager(object):
     def print_snapshot(self):
         """Print the full state snapshot for debugging."""
 
-        formatted = json.dumps(self.snapshot(), indent=2, ensure_ascii=False)
+        formatted = dumps_pretty(self.snapshot())
         print(f"[state] {formatted}")
@@ -6,56 +6,253 @@
 
 """
 
+import json
+import os
+import re
+import sys
+from functools import lru_cache
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# full escape prefix per color, so colorize() only concatenates
+_ANSI_PREFIX = {
+    "yellow": "\033[33m",
+    "cyan": "\033[36m",
+    "gray": "\033[90m",
+}
+_ANSI_RESET = "\033[0m"
+
+# process-wide color switch read by paint(), set once at startup
+COLOR_ENABLED = False
+
+
+# longer strings are mostly one-off replies, not worth a cache slot
+_COLORIZE_CACHE_MAX_LEN = 64
+
+
 def colorize(text, color, enabled):
-    """Apply ANSI color codes when enabled."""
+    """Apply ANSI color codes when enabled.
 
+    Short strings such as prompts and labels repeat all session long,
+    so their colored form is cached.
+    """
+
+    # checked first: with color off (pipes, --no-color) nothing else runs
     if not enabled:
         return text
 
-    codes = {
-        "yellow": "33",
-        "cyan": "36",
-        "gray": "90",
-    }
-    code = codes.get(color)
+    if len(text) <= _COLORIZE_CACHE_MAX_LEN:
+        return _colorize_cached(text, color)
+
+    return _apply_color(text, color)
 
-    if not code:
+
+def _apply_color(text, color):
+    prefix = _ANSI_PREFIX.get(color)
+    if prefix is None:
         return text
 
-    return f"\033[{code}m{text}\033[0m"
+    # one allocation, a + b + c builds an intermediate string first
+    return "".join((prefix, text, _ANSI_RESET))
+
+
+_colorize_cached = lru_cache(maxsize=256)(_apply_color)
+
+
+def set_color_enabled(enabled):
+    """Turn colored output from paint() on or off for the whole process."""
+
+    global COLOR_ENABLED
+    COLOR_ENABLED = bool(enabled)
+
+
+def paint(text, color):
+    """colorize() driven by the process-wide COLOR_ENABLED switch.
+
+    With color off this returns right away; hot loops can also read
+    ``utils.COLOR_ENABLED`` themselves and skip the call entirely.
+    """
+
+    if not COLOR_ENABLED:
+        return text
+
+    return colorize(text, color, True)
+
+
+def paint_codes(color):
+    """Return ``(prefix, reset)`` for text written in pieces, such as a
+    streamed reply, or two empty strings when color is off."""
+
+    prefix = _ANSI_PREFIX.get(color) if COLOR_ENABLED else None
+    if prefix is None:
+        return "", ""
+
+    return prefix, _ANSI_RESET
+
+
+_ENV_LOADED = False
+
+# path -> (mtime_ns, {key: value}), an unchanged file is not parsed again
+_ENV_CACHE = {}
+
+# quoted .env values, a backslash escapes the next character
+_ENV_DOUBLE_QUOTED = re.compile(r'"((?:\\.|[^"\\])*)"')
+_ENV_SINGLE_QUOTED = re.compile(r"'((?:\\.|[^'\\])*)'")
+
+# escapes understood in double-quoted values, same set as python-dotenv
+_ENV_ESCAPES = {
+    "\\": "\\", '"': '"', "'": "'",
+    "a": "\a", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t", "v": "\v",
+}
+_ENV_DOUBLE_ESCAPE = re.compile(r"\\([\\\"'abfnrtv])")
+_ENV_SINGLE_ESCAPE = re.compile(r"\\([\\'])")
 
 
-def load_env_files():
-    """Load environment variables from .env files if present."""
+def load_env_files(force=False):
+    """Load environment variables from .env files if present.
 
-    try:
-        from dotenv import load_dotenv
-    except ImportError:
+    Only the first call reads the files; pass ``force=True`` to load
+    them again. With ``TINY_AGENT_ENV=production`` only ``.env`` is
+    read, ``.env.local`` is meant for development overrides. Variables
+    already set in the environment are never overridden.
+    """
+
+    global _ENV_LOADED
+    if _ENV_LOADED and not force:
         return
 
-    for path in (".env", ".env.local"):
-        load_dotenv(dotenv_path=path, override=False)
+    _ENV_LOADED = True
+
+    if os.environ.get("TINY_AGENT_ENV") == "production":
+        candidates = (".env",)
+    else:
+        candidates = (".env", ".env.local")
+
+    for path in candidates:
+        try:
+            env = _parse_env_file(path)
+        except (OSError, UnicodeDecodeError):
+            continue
+
+        for key, value in env.items():
+            os.environ.setdefault(key, value)
+
+
+def _parse_env_file(path):
+    """Return the ``KEY=VALUE`` pairs of a .env file as a dict.
+
+    Supports comments, blank lines, an optional ``export`` prefix and
+    single- or double-quoted values. Double-quoted values understand
+    backslash escapes such as ``\\"`` and ``\\n``, single-quoted ones
+    only ``\\'`` and ``\\\\``. Variable expansion and multi-line values
+    are not supported.
+    """
+
+    mtime = os.stat(path).st_mtime_ns
+    cached = _ENV_CACHE.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    env = {}
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+
+            if line.startswith("export "):
+                line = line[7:].lstrip()
+
+            key, sep, value = line.partition("=")
+            key = key.strip()
+            if not sep or not key:
+                continue
+
+            value = value.strip()
+
+            # anything after the closing quote is an inline comment
+            if value.startswith('"') and (match := _ENV_DOUBLE_QUOTED.match(value)):
+                value = _ENV_DOUBLE_ESCAPE.sub(
+                    lambda m: _ENV_ESCAPES[m.group(1)], match.group(1)
+                )
+            elif value.startswith("'") and (match := _ENV_SINGLE_QUOTED.match(value)):
+                value = _ENV_SINGLE_ESCAPE.sub(r"\1", match.group(1))
+            elif " #" in value:
+                value = value.split(" #", 1)[0].rstrip()
+
+            env[key] = value
+
+    _ENV_CACHE[path] = (mtime, env)
+    return env
+
+
+def dumps_pretty(obj):
+    """Return ``obj`` as indented JSON text, using orjson when installed."""
+
+    if orjson is not None:
+        return orjson.dumps(
+            obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+        ).decode("utf-8")
+
+    return json.dumps(obj, indent=2, ensure_ascii=False)
 
 
 def approx_token_count(text):
-    """Return a rough token count using a 4-chars-per-token heuristic."""
+    """Return a rough token count using a 4-chars-per-token heuristic.
+
+    Rounds up, so any non-empty text counts as at least one token.
+    """
+
+    return (len(text) + 3) >> 2 if text else 0
+
+
+# --debug categories, interned so debug_enabled() lookups compare by identity
+DEBUG_CONTEXT = sys.intern("context")
+DEBUG_STATE = sys.intern("state")
+DEBUG_REQUESTS = sys.intern("requests")
+
 
-    if not text:
-        return 0
+_ALL_DEBUG = frozenset((DEBUG_CONTEXT, DEBUG_STATE, DEBUG_REQUESTS))
+_NO_DEBUG = frozenset()
 
-    return max(1, int(len(text) / 4))
+# raw --debug value -> parsed flags, so the same value always maps to
+# the same frozenset object
+_PARSED_DEBUG = {}
+_PARSED_DEBUG_MAX = 32
 
 
 def parse_debug_flags(raw):
-    """Parse the --debug flag into a set of categories."""
+    """Parse the --debug flag into a frozenset of categories."""
 
     if not raw:
-        return set()
+        return _NO_DEBUG
 
-    flags = set(raw.split(","))
+    flags = _PARSED_DEBUG.get(raw)
+    if flags is None:
+        flags = _parse_debug_flags(raw)
+        if len(_PARSED_DEBUG) < _PARSED_DEBUG_MAX:
+            _PARSED_DEBUG[raw] = flags
+
+    return flags
+
+
+def _parse_debug_flags(raw):
+    if raw == "all":
+        return _ALL_DEBUG
+
+    # a single category is the usual case, no need to split
+    if "," not in raw:
+        return frozenset((sys.intern(raw),))
+
+    # split() returns fresh strings, intern them to match the constants
+    flags = frozenset(sys.intern(flag) for flag in raw.split(","))
 
     if "all" in flags:
-        return {"context", "state", "requests"}
+        return _ALL_DEBUG
 
     return flags
 
@@ -63,4 +260,8 @@ def parse_debug_flags(raw):
 def debug_enabled(category, flags):
     """Check if a debug category is active."""
 
+    # debug off is the common case, skip the set lookup
+    if flags is _NO_DEBUG:
+        return False
+
     return category in flags